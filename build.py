@@ -0,0 +1,933 @@
+#!/usr/bin/env python3
+"""
+Static Asset Build for AP Calculus BC Unit Pages
+Pre-renders static KaTeX math, extracts CSS rules and JS functions shared
+between the U1.x pages into minified, content-hashed bundles and writes a
+deployable copy to dist/, including the service worker with its cache
+version stamped
+
+Math is rendered with the vendored KaTeX in vendor/katex, so Node.js must
+be on PATH.
+
+Usage:
+    python3 build.py                 # build into ./dist
+    python3 build.py --out public    # build somewhere else
+
+The built site is tested exactly like the source tree:
+    python3 -m http.server 8080 --directory dist
+    python3 test_pages.py
+"""
+
+import argparse
+import hashlib
+import html as htmllib
+import json
+import re
+import shutil
+import subprocess
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent
+UNIT_PAGES = sorted(path.name for path in ROOT.glob("U[0-9]*.html"))
+ASSET_DIR = "assets"
+STATIC_FILES = ["index.html"]
+STATIC_DIRS = ["lib"]
+
+# The service worker's cache name is stamped from everything it caches, so
+# each deploy with changed pages or lib files replaces the old copies
+SERVICE_WORKER = "sw.js"
+SW_VERSION_RE = re.compile(r"^const CACHE_VERSION = '[^']*';", re.MULTILINE)
+SW_BUILD_URLS_RE = re.compile(r"^const BUILD_URLS = \[\];", re.MULTILINE)
+
+# Bundles smaller than this cost more as an extra request than they save
+MIN_BUNDLE_BYTES = 2048
+
+STYLE_RE = re.compile(r"<style>(.*?)</style>", re.DOTALL)
+INLINE_SCRIPT_RE = re.compile(r"<script>(.*?)</script>", re.DOTALL)
+FUNCTION_RE = re.compile(r"^([ \t]*)(?:async[ \t]+)?function[ \t]+([A-Za-z_$][\w$]*)[ \t]*\(", re.MULTILINE)
+
+# Must match the katex.min.css version the pages load from the CDN
+KATEX_JS = ROOT / "vendor" / "katex" / "katex.min.js"
+KATEX_SCRIPT_RE = re.compile(r'[ \t]*<script defer src="[^"]*/katex@[^"]*/(?:katex|contrib/auto-render)\.min\.js"></script>\n')
+
+# Same delimiters and skipped elements as KaTeX auto-render; each page's
+# PanelHydration.init math config must use exactly these delimiters
+MATH_DELIMITERS = [("\\(", "\\)", False), ("\\[", "\\]", True)]
+HYDRATION_INIT_RE = re.compile(r"PanelHydration\.init\((.*?)\);", re.DOTALL)
+JS_DELIMITER_RE = re.compile(r"\{\s*left:\s*'((?:\\.|[^'])*)',\s*right:\s*'((?:\\.|[^'])*)',\s*display:\s*(true|false)\s*\}")
+MATH_IGNORED_TAGS = {"script", "noscript", "style", "textarea", "pre", "code", "option"}
+TAG_RE = re.compile(r"<!--.*?-->|<(/?)([a-zA-Z][\w-]*)(?:[^>\"']|\"[^\"]*\"|'[^']*')*>", re.DOTALL)
+
+# Renders a JSON list of [tex, displayMode] from stdin to a JSON list of HTML
+KATEX_RENDERER = """
+const katex = require(process.argv[1]);
+let input = '';
+process.stdin.on('data', chunk => { input += chunk; });
+process.stdin.on('end', () => {
+    const html = JSON.parse(input).map(([tex, displayMode]) =>
+        katex.renderToString(tex, { displayMode, throwOnError: false }));
+    process.stdout.write(JSON.stringify(html));
+});
+"""
+
+# Characters after which a "/" starts a regex literal rather than a division
+REGEX_PRECEDERS = set("(,=:[!&|?{};+-*%<>~^")
+
+
+# ========== SCANNING HELPERS ==========
+
+def _skip_string(text, i):
+    """Return the index just past the quoted string starting at text[i]"""
+    quote = text[i]
+    i += 1
+    while i < len(text):
+        if text[i] == "\\":
+            i += 2
+            continue
+        if text[i] == quote:
+            return i + 1
+        i += 1
+    return i
+
+
+def _skip_css_comment(text, i):
+    end = text.find("*/", i + 2)
+    return len(text) if end == -1 else end + 2
+
+
+def _collapse_ws(text, tight=""):
+    """Collapse whitespace outside quotes, dropping it around any char in `tight`"""
+    out = []
+    i = 0
+    while i < len(text):
+        c = text[i]
+        if c in "\"'":
+            j = _skip_string(text, i)
+            out.append(text[i:j])
+            i = j
+        elif c.isspace():
+            while i < len(text) and text[i].isspace():
+                i += 1
+            prev = out[-1][-1:] if out else ""
+            nxt = text[i:i + 1]
+            if prev and nxt and prev not in tight and nxt not in tight:
+                out.append(" ")
+        else:
+            out.append(c)
+            i += 1
+    return "".join(out).strip()
+
+
+def _split_top_level(text, sep):
+    """Split on `sep` outside quotes, parentheses and brackets"""
+    parts = []
+    depth = 0
+    start = 0
+    i = 0
+    while i < len(text):
+        c = text[i]
+        if c in "\"'":
+            i = _skip_string(text, i)
+            continue
+        if c in "([":
+            depth += 1
+        elif c in ")]":
+            depth -= 1
+        elif c == sep and depth == 0:
+            parts.append(text[start:i])
+            start = i + 1
+        i += 1
+    parts.append(text[start:])
+    return parts
+
+
+# ========== CSS ==========
+
+def _strip_css_comments(text):
+    out = []
+    i = 0
+    while i < len(text):
+        if text[i] in "\"'":
+            j = _skip_string(text, i)
+            out.append(text[i:j])
+            i = j
+        elif text.startswith("/*", i):
+            i = _skip_css_comment(text, i)
+            out.append(" ")
+        else:
+            out.append(text[i])
+            i += 1
+    return "".join(out)
+
+
+def _css_block_end(text, i):
+    """Given text[i] == '{', return the index just past the matching '}'"""
+    depth = 0
+    while i < len(text):
+        c = text[i]
+        if c in "\"'":
+            i = _skip_string(text, i)
+            continue
+        if text.startswith("/*", i):
+            i = _skip_css_comment(text, i)
+            continue
+        if c == "{":
+            depth += 1
+        elif c == "}":
+            depth -= 1
+            if depth == 0:
+                return i + 1
+        i += 1
+    return len(text)
+
+
+def parse_css_blocks(text):
+    """Split a stylesheet into top-level (start, end) spans, one per rule or at-rule"""
+    spans = []
+    i = 0
+    while i < len(text):
+        if text[i].isspace():
+            i += 1
+            continue
+        if text.startswith("/*", i):
+            i = _skip_css_comment(text, i)
+            continue
+        start = i
+        while i < len(text) and text[i] not in "{;":
+            if text[i] in "\"'":
+                i = _skip_string(text, i)
+            elif text.startswith("/*", i):
+                i = _skip_css_comment(text, i)
+            else:
+                i += 1
+        if i < len(text) and text[i] == "{":
+            i = _css_block_end(text, i)
+        else:
+            i += 1
+        spans.append((start, i))
+    return spans
+
+
+def _minify_declarations(body):
+    decls = []
+    for decl in _split_top_level(body, ";"):
+        decl = decl.strip()
+        if not decl:
+            continue
+        prop, _, value = decl.partition(":")
+        decls.append(f"{prop.strip()}:{_collapse_ws(value, tight=',')}")
+    return ";".join(decls)
+
+
+def minify_css_block(block):
+    """Serialize one rule/at-rule with comments and redundant whitespace removed"""
+    block = _strip_css_comments(block).strip()
+    brace = block.find("{")
+    if brace == -1:
+        return _collapse_ws(block)
+    prelude = block[:brace]
+    body = block[brace + 1:-1]
+    if prelude.lstrip().startswith("@"):
+        prelude = _collapse_ws(prelude)
+        if "{" in body:
+            inner = "".join(minify_css_block(body[s:e]) for s, e in parse_css_blocks(body))
+            return f"{prelude}{{{inner}}}"
+        return f"{prelude}{{{_minify_declarations(body)}}}"
+    return f"{_collapse_ws(prelude, tight=',>')}{{{_minify_declarations(body)}}}"
+
+
+PSEUDO_ELEMENTS = {"before", "after", "first-line", "first-letter", "placeholder", "selection", "marker"}
+
+
+def _specificity(selector):
+    sel = re.sub(r"\"[^\"]*\"|'[^']*'", "", selector)
+    sel = re.sub(r":(nth-[\w-]+|lang|dir)\([^)]*\)", r":\1", sel)
+    sel = re.sub(r":(not|is|has)\(", "(", sel)
+    ids = len(re.findall(r"#[\w-]+", sel))
+    classes = len(re.findall(r"\.[\w-]+|\[[^\]]*\]", sel))
+    pseudo_elements = 0
+    for colons, name in re.findall(r"(::?)([\w-]+)", sel):
+        if colons == "::" or name in PSEUDO_ELEMENTS:
+            pseudo_elements += 1
+        else:
+            classes += 1
+    types = len(re.findall(r"(?:^|[\s>+~(,])([a-zA-Z][\w-]*)", sel))
+    return (ids, classes, types + pseudo_elements)
+
+
+def _subject(selector):
+    """Describe the rightmost compound selector as (tag, id, pseudo-element, classes)"""
+    compound = re.sub(r"\([^()]*\)", "", selector.strip())
+    compound = re.split(r"[\s>+~]+", compound)[-1]
+    tag = re.match(r"[a-zA-Z][\w-]*", compound)
+    id_ = re.search(r"#([\w-]+)", compound)
+    pseudo = None
+    for colons, name in re.findall(r"(::?)([\w-]+)", compound):
+        if colons == "::" or name in PSEUDO_ELEMENTS:
+            pseudo = name
+    classes = frozenset(re.findall(r"\.([\w-]+)", compound))
+    return (tag.group(0).lower() if tag else None, id_.group(1) if id_ else None, pseudo, classes)
+
+
+# Longhand prefixes whose shorthand doesn't share their name
+SHORTHAND_FAMILIES = {
+    "top": "inset", "right": "inset", "bottom": "inset", "left": "inset",
+    "line": "font", "align": "place", "justify": "place",
+    "row": "gap", "column": "gap", "columns": "gap",
+}
+
+
+def _property_family(prop):
+    """Group longhands with their shorthand so margin-top clashes with margin"""
+    prop = prop.strip().lower()
+    if prop.startswith("--"):
+        return prop
+    prop = re.sub(r"^-(webkit|moz|ms|o)-", "", prop)
+    family = prop.split("-")[0]
+    return SHORTHAND_FAMILIES.get(family, family)
+
+
+def _style_entries(block):
+    """Flatten a rule or @media block into (specificity, subject, property families)"""
+    block = _strip_css_comments(block).strip()
+    brace = block.find("{")
+    prelude, body = block[:brace], block[brace + 1:-1]
+    if prelude.lstrip().startswith("@"):
+        entries = []
+        for s, e in parse_css_blocks(body):
+            entries.extend(_style_entries(body[s:e]))
+        return entries
+    families = {_property_family(d.partition(":")[0]) for d in _split_top_level(body, ";") if d.strip()}
+    return [(_specificity(sel), _subject(sel), families) for sel in _split_top_level(prelude, ",")]
+
+
+def describe_css_block(block):
+    """Classify a block for cascade analysis; only rule/@media/@keyframes are movable"""
+    prelude = _strip_css_comments(block).split("{", 1)[0].strip()
+    if "{" not in block:
+        return {"kind": "other"}
+    if prelude.startswith("@keyframes") or prelude.startswith("@-webkit-keyframes"):
+        return {"kind": "keyframes", "name": prelude.split()[-1]}
+    if prelude.startswith("@") and not prelude.startswith("@media"):
+        return {"kind": "other"}
+    return {"kind": "style", "entries": _style_entries(block)}
+
+
+def collect_classes(html):
+    """Find which class combinations can appear together on one element
+
+    Returns (class_sets, dynamic): every class list written in markup or
+    script templates, plus every class a script adds through classList.
+    """
+    class_sets = {frozenset(m.group(2).split())
+                  for m in re.finditer(r"\bclass(?:Name)?\s*=\s*([\"'`])(.*?)\1", html, re.DOTALL)}
+    dynamic = set()
+    for call in re.finditer(r"classList\.(?:add|toggle|replace)\(([^)]*)\)", html):
+        for literal in re.finditer(r"([\"'`])(.*?)\1", call.group(1)):
+            dynamic.update(literal.group(2).split())
+    return class_sets, dynamic
+
+
+def _subjects_may_overlap(a, b, classes):
+    (tag_a, id_a, pseudo_a, cls_a), (tag_b, id_b, pseudo_b, cls_b) = a, b
+    if tag_a and tag_b and tag_a != tag_b:
+        return False
+    if id_a and id_b and id_a != id_b:
+        return False
+    if pseudo_a != pseudo_b:
+        return False
+    class_sets, dynamic = classes
+    required = (cls_a | cls_b) - dynamic
+    return len(required) <= 1 or any(required <= s for s in class_sets)
+
+
+def css_blocks_conflict(a, b, classes):
+    """True if swapping the source order of a and b could change the cascade on this page"""
+    if a["kind"] == "keyframes" or b["kind"] == "keyframes":
+        return a["kind"] == b["kind"] and a["name"] == b["name"]
+    for spec_a, subj_a, props_a in a["entries"]:
+        for spec_b, subj_b, props_b in b["entries"]:
+            shared_props = props_a & props_b or "all" in props_a | props_b
+            if spec_a == spec_b and shared_props and _subjects_may_overlap(subj_a, subj_b, classes):
+                return True
+    return False
+
+
+# ========== JAVASCRIPT ==========
+
+def _skip_js_comment(text, i):
+    if text.startswith("//", i):
+        end = text.find("\n", i)
+        return len(text) if end == -1 else end
+    end = text.find("*/", i + 2)
+    return len(text) if end == -1 else end + 2
+
+
+def _skip_js_regex(text, i):
+    i += 1
+    in_class = False
+    while i < len(text) and text[i] != "\n":
+        c = text[i]
+        if c == "\\":
+            i += 2
+            continue
+        if c == "[":
+            in_class = True
+        elif c == "]":
+            in_class = False
+        elif c == "/" and not in_class:
+            return i + 1
+        i += 1
+    return i
+
+
+def _skip_template(text, i):
+    """Return the index just past the template literal starting at text[i]"""
+    i += 1
+    while i < len(text):
+        c = text[i]
+        if c == "\\":
+            i += 2
+            continue
+        if c == "`":
+            return i + 1
+        if text.startswith("${", i):
+            i = _js_block_end(text, i + 1)
+            continue
+        i += 1
+    return i
+
+
+def _js_tokens(text, i=0):
+    """Yield (index, char) for code characters, skipping strings, comments and regexes"""
+    prev = ""
+    while i < len(text):
+        c = text[i]
+        if c in "\"'":
+            i = _skip_string(text, i)
+            prev = "a"
+            continue
+        if c == "`":
+            i = _skip_template(text, i)
+            prev = "a"
+            continue
+        if text.startswith("//", i) or text.startswith("/*", i):
+            i = _skip_js_comment(text, i)
+            continue
+        if c == "/" and (prev == "" or prev in REGEX_PRECEDERS):
+            i = _skip_js_regex(text, i)
+            prev = "a"
+            continue
+        yield i, c
+        if not c.isspace():
+            prev = c
+        i += 1
+
+
+def _js_block_end(text, i):
+    """Given text[i] == '{', return the index just past the matching '}'"""
+    depth = 0
+    for j, c in _js_tokens(text, i):
+        if c == "{":
+            depth += 1
+        elif c == "}":
+            depth -= 1
+            if depth == 0:
+                return j + 1
+    return len(text)
+
+
+def parse_js_functions(script):
+    """Find top-level function declarations in an inline script
+
+    Returns a list of {"name", "start", "end"} where [start, end) spans the
+    whole declaration including its indentation and trailing newline.
+    """
+    lines = [line for line in script.splitlines() if line.strip()]
+    if not lines:
+        return []
+    top_indent = min(len(line) - len(line.lstrip()) for line in lines)
+
+    functions = []
+    pos = 0
+    for match in FUNCTION_RE.finditer(script):
+        if match.start() < pos or len(match.group(1)) != top_indent:
+            continue
+        # Skip the parameter list so default values can't be taken for the body
+        depth = 0
+        brace = None
+        for j, c in _js_tokens(script, match.end() - 1):
+            if c == "(":
+                depth += 1
+            elif c == ")":
+                depth -= 1
+            elif c == "{" and depth == 0:
+                brace = j
+                break
+        if brace is None:
+            continue
+        end = _js_block_end(script, brace)
+        if script.startswith("\n", end):
+            end += 1
+        functions.append({"name": match.group(2), "start": match.start(), "end": end})
+        pos = end
+    return functions
+
+
+def minify_js(code):
+    """Drop comments, indentation and blank lines while keeping statement newlines"""
+    out = []
+    i = 0
+    prev = ""
+    at_line_start = True
+    while i < len(code):
+        c = code[i]
+        if at_line_start and c in " \t":
+            i += 1
+            continue
+        at_line_start = False
+        if c in "\"'":
+            j = _skip_string(code, i)
+        elif c == "`":
+            j = _skip_template(code, i)
+        elif code.startswith("//", i):
+            i = _skip_js_comment(code, i)
+            continue
+        elif code.startswith("/*", i):
+            i = _skip_js_comment(code, i)
+            out.append(" ")
+            continue
+        elif c == "/" and (prev == "" or prev in REGEX_PRECEDERS):
+            j = _skip_js_regex(code, i)
+        elif c == "\n":
+            if out and out[-1] != "\n":
+                out.append("\n")
+            at_line_start = True
+            i += 1
+            continue
+        else:
+            out.append(c)
+            if not c.isspace():
+                prev = c
+            i += 1
+            continue
+        out.append(code[i:j])
+        prev = "a"
+        i = j
+    return "".join(out).strip() + "\n"
+
+
+# ========== MATH PRE-RENDERING ==========
+
+def _end_of_math(text, right, i):
+    """Port of auto-render's findEndOfMath: the closing delimiter at brace depth 0"""
+    depth = 0
+    while i < len(text):
+        if depth <= 0 and text.startswith(right, i):
+            return i
+        if text[i] == "\\":
+            i += 1
+        elif text[i] == "{":
+            depth += 1
+        elif text[i] == "}":
+            depth -= 1
+        i += 1
+    return -1
+
+
+def _math_in_text(text, offset):
+    """Yield (start, end, tex, display) for delimited math in one text node"""
+    i = 0
+    while True:
+        found = [(text.find(left, i), left, right, display) for left, right, display in MATH_DELIMITERS]
+        found = [f for f in found if f[0] != -1]
+        if not found:
+            return
+        start, left, right, display = min(found, key=lambda f: f[0])
+        end = _end_of_math(text, right, start + len(left))
+        if end == -1:
+            return
+        tex = htmllib.unescape(text[start + len(left):end])
+        yield offset + start, offset + end + len(right), tex, display
+        i = end + len(right)
+
+
+def page_math_delimiters(html):
+    """Return the delimiters a page passes to PanelHydration.init, or None"""
+    init = HYDRATION_INIT_RE.search(html)
+    if not init:
+        return None
+    unescape = lambda js: re.sub(r"\\(.)", r"\1", js)
+    return {(unescape(left), unescape(right), display == "true")
+            for left, right, display in JS_DELIMITER_RE.findall(init.group(1))}
+
+
+def find_static_math(html):
+    """Find math in the text of <body>, skipping the elements auto-render skips"""
+    body = html.find("<body")
+    found = []
+    pos = body
+    skip_until = None
+    for tag in TAG_RE.finditer(html, body):
+        if skip_until is None and tag.start() > pos:
+            found.extend(_math_in_text(html[pos:tag.start()], pos))
+        pos = tag.end()
+        closing, name = tag.group(1), (tag.group(2) or "").lower()
+        if skip_until is None and not closing and name in MATH_IGNORED_TAGS:
+            skip_until = name
+        elif skip_until == name and closing:
+            skip_until = None
+    return found
+
+
+def render_math(items):
+    """Render [(tex, display)] with the vendored KaTeX in a single Node process"""
+    if not shutil.which("node"):
+        raise SystemExit("build.py: Node.js is required to pre-render KaTeX math")
+    result = subprocess.run(
+        ["node", "-e", KATEX_RENDERER, str(KATEX_JS)],
+        input=json.dumps(items), capture_output=True, text=True, check=True,
+    )
+    return json.loads(result.stdout)
+
+
+def prerender_math(pages):
+    """Replace static math in each page with KaTeX HTML
+
+    Pages are marked with data-katex-prerendered so lib/hydrate.js skips
+    typesetting panels. Pages whose inline scripts never render math
+    themselves also stop loading the KaTeX scripts; the stylesheet is
+    always kept.
+    Returns {name: (html, math count)}.
+    """
+    # Math in delimiters the build doesn't know would stay raw once the
+    # KaTeX scripts are dropped
+    for name, html in pages.items():
+        delimiters = page_math_delimiters(html)
+        if delimiters is not None and delimiters != set(MATH_DELIMITERS):
+            extra = sorted(left for left, _, _ in delimiters - set(MATH_DELIMITERS))
+            missing = sorted(left for left, _, _ in set(MATH_DELIMITERS) - delimiters)
+            raise SystemExit(f"build.py: {name} math delimiters differ from MATH_DELIMITERS "
+                             f"(extra: {extra or 'none'}, missing: {missing or 'none'})")
+
+    found = {name: find_static_math(html) for name, html in pages.items()}
+    rendered = iter(render_math([[tex, display] for spans in found.values() for _, _, tex, display in spans]))
+
+    result = {}
+    for name, html in pages.items():
+        out = []
+        pos = 0
+        for start, end, _, _ in found[name]:
+            out.append(html[pos:start])
+            out.append(f"<span>{next(rendered)}</span>")
+            pos = end
+        out.append(html[pos:])
+        html = "".join(out).replace("<body>", "<body data-katex-prerendered>", 1)
+
+        scripts = "".join(INLINE_SCRIPT_RE.findall(html))
+        if "renderMathInElement(" not in scripts and "katex." not in scripts:
+            html = KATEX_SCRIPT_RE.sub("", html)
+        result[name] = (html, len(found[name]))
+    return result
+
+
+# ========== BUNDLE PLANNING ==========
+
+def _content_hash(text):
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()[:10]
+
+
+def _page_sets(pages, chunk_key):
+    """Map each chunk key to the tuple of pages containing it"""
+    owners = {}
+    for name in pages:
+        for chunk in pages[name]:
+            owners.setdefault(chunk_key(chunk), [])
+            if name not in owners[chunk_key(chunk)]:
+                owners[chunk_key(chunk)].append(name)
+    return {key: tuple(sorted(names)) for key, names in owners.items() if len(names) > 1}
+
+
+def _group_bundles(assignment, sizes):
+    bundles = {}
+    for key, page_set in assignment.items():
+        bundles.setdefault(page_set, []).append(key)
+    return {ps: keys for ps, keys in bundles.items() if sum(sizes[k] for k in keys) >= MIN_BUNDLE_BYTES}
+
+
+def _bundle_order(bundles):
+    """Broadest bundles load first"""
+    return sorted(bundles, key=lambda ps: (-len(ps), ps))
+
+
+def _css_violation(chunks, classes, bundles):
+    """Find a bundled chunk whose hoisting would reorder it past a conflicting rule"""
+    first_seen = {}
+    for idx, chunk in enumerate(chunks):
+        first_seen.setdefault(chunk["key"], idx)
+    hoisted = [k for ps in _bundle_order(bundles) for k in bundles[ps]]
+    position = {first_seen[k]: n for n, k in enumerate(hoisted)}
+    for idx in range(len(chunks)):
+        position.setdefault(idx, len(hoisted) + idx)
+    for b, new_b in position.items():
+        if new_b >= len(hoisted):
+            continue
+        for a in range(b):
+            if position[a] > new_b and css_blocks_conflict(chunks[a]["info"], chunks[b]["info"], classes):
+                return chunks[b]["key"]
+    return None
+
+
+def plan_css_bundles(pages):
+    """Choose which CSS blocks move into which shared bundle
+
+    `pages` maps page name to {"chunks": [{"key", "info"}...], "classes": ...}
+    in source order. Returns {page_set: [keys in bundle order]}.
+    """
+    sizes = {}
+    order_hint = {}
+    for name in sorted(pages):
+        for idx, chunk in enumerate(pages[name]["chunks"]):
+            sizes[chunk["key"]] = len(chunk["key"])
+            order_hint.setdefault((name, chunk["key"]), idx)
+
+    chunk_lists = {name: page["chunks"] for name, page in pages.items()}
+    movable = {c["key"] for chunks in chunk_lists.values() for c in chunks if c["info"]["kind"] != "other"}
+    assignment = {k: ps for k, ps in _page_sets(chunk_lists, lambda c: c["key"]).items() if k in movable}
+    while True:
+        bundles = _group_bundles(assignment, sizes)
+        bundles = {ps: sorted(keys, key=lambda k: order_hint[(ps[0], k)]) for ps, keys in bundles.items()}
+        demoted = None
+        for name, page in pages.items():
+            mine = {ps: keys for ps, keys in bundles.items() if name in ps}
+            demoted = _css_violation(page["chunks"], page["classes"], mine)
+            if demoted:
+                break
+        if demoted:
+            del assignment[demoted]
+        elif len(assignment) == sum(len(keys) for keys in bundles.values()):
+            return bundles
+        else:
+            # Demotions shrank some bundles below the size floor
+            assignment = {k: ps for k, ps in assignment.items() if ps in bundles}
+
+
+def plan_js_bundles(pages):
+    """Group identical function declarations by the set of pages defining them
+
+    A name declared twice in one page relies on the later declaration
+    winning, so those stay inline where their order is preserved.
+    """
+    redeclared = set()
+    for functions in pages.values():
+        names = [f["name"] for f in functions]
+        redeclared.update(n for n in names if names.count(n) > 1)
+    owners = {code: ps for code, ps in _page_sets(pages, lambda f: f["code"]).items()
+              if not any(f["name"] in redeclared for n in ps for f in pages[n] if f["code"] == code)}
+    sizes = {code: len(code) for code in owners}
+    bundles = _group_bundles(owners, sizes)
+    first_page = {ps: ps[0] for ps in bundles}
+    for ps, codes in bundles.items():
+        position = {f["code"]: n for n, f in enumerate(pages[first_page[ps]])}
+        codes.sort(key=position.get)
+    return bundles
+
+
+# ========== PAGE REWRITING ==========
+
+def _whole_lines(text, start, end):
+    """Widen a span to cover its own lines when nothing else shares them"""
+    line_start = text.rfind("\n", 0, start) + 1
+    if not text[line_start:start].strip():
+        start = line_start
+    line_end = text.find("\n", end)
+    if line_end != -1 and not text[end:line_end].strip():
+        end = line_end + 1
+    return start, end
+
+
+def _remove_spans(text, spans):
+    out = []
+    pos = 0
+    for start, end in sorted(spans):
+        out.append(text[pos:start])
+        pos = end
+    out.append(text[pos:])
+    return "".join(out)
+
+
+def read_page(html):
+    css_chunks = []
+    for style in STYLE_RE.finditer(html):
+        body = style.group(1)
+        for start, end in parse_css_blocks(body):
+            block = body[start:end]
+            css_chunks.append({
+                "key": minify_css_block(block),
+                "info": describe_css_block(block),
+                "span": _whole_lines(html, style.start(1) + start, style.start(1) + end),
+            })
+    js_chunks = []
+    for script in INLINE_SCRIPT_RE.finditer(html):
+        body = script.group(1)
+        for fn in parse_js_functions(body):
+            js_chunks.append({
+                "name": fn["name"],
+                "code": minify_js(body[fn["start"]:fn["end"]]),
+                "span": (script.start(1) + fn["start"], script.start(1) + fn["end"]),
+            })
+    return {"html": html, "css": css_chunks, "js": js_chunks, "classes": collect_classes(html)}
+
+
+def rewrite_page(page, name, css_bundles, js_bundles, bundle_files):
+    """Strip bundled code from a page and link the bundles in its place"""
+    html = page["html"]
+    spans = []
+
+    links = []
+    for ps in _bundle_order(css_bundles):
+        if name not in ps:
+            continue
+        keys = set(css_bundles[ps])
+        seen = set()
+        for chunk in page["css"]:
+            if chunk["key"] in keys and chunk["key"] not in seen:
+                seen.add(chunk["key"])
+                spans.append(chunk["span"])
+        links.append(f'<link rel="stylesheet" href="{bundle_files[("css", ps)]}">')
+
+    scripts = []
+    for ps in _bundle_order(js_bundles):
+        if name not in ps:
+            continue
+        codes = set(js_bundles[ps])
+        spans.extend(fn["span"] for fn in page["js"] if fn["code"] in codes)
+        scripts.append(f'<script src="{bundle_files[("js", ps)]}"></script>')
+
+    html = _remove_spans(html, spans)
+    # Shared styles go where the inline styles started so cascade order holds,
+    # shared functions go before the first inline script that might call them
+    if links:
+        at = html.find("<style>")
+        html = html[:at] + "\n    ".join(links) + "\n    " + html[at:]
+    if scripts:
+        at = html.find("<script>")
+        html = html[:at] + "\n    ".join(scripts) + "\n    " + html[at:]
+    return html
+
+
+def build(out_dir):
+    """Build every unit page into out_dir and return the asset manifest"""
+    out_dir.mkdir(parents=True, exist_ok=True)
+    asset_dir = out_dir / ASSET_DIR
+    if asset_dir.exists():
+        shutil.rmtree(asset_dir)
+    asset_dir.mkdir()
+
+    sources = {name: (ROOT / name).read_text(encoding="utf-8") for name in UNIT_PAGES}
+    prerendered = prerender_math(sources)
+    pages = {name: read_page(prerendered[name][0]) for name in UNIT_PAGES}
+
+    css_bundles = plan_css_bundles({n: {"chunks": p["css"], "classes": p["classes"]} for n, p in pages.items()})
+    js_bundles = plan_js_bundles({n: p["js"] for n, p in pages.items()})
+
+    bundle_files = {}
+    manifest = {"bundles": [], "pages": []}
+    for kind, bundles in (("css", css_bundles), ("js", js_bundles)):
+        for ps in _bundle_order(bundles):
+            content = "".join(bundles[ps])
+            rel = f"{ASSET_DIR}/shared.{_content_hash(content)}.{kind}"
+            (out_dir / rel).write_text(content, encoding="utf-8")
+            bundle_files[(kind, ps)] = rel
+            manifest["bundles"].append({
+                "file": rel,
+                "pages": list(ps),
+                "bytes": len(content.encode("utf-8")),
+                "items": len(bundles[ps]),
+            })
+
+    for name in UNIT_PAGES:
+        html = rewrite_page(pages[name], name, css_bundles, js_bundles, bundle_files)
+        (out_dir / name).write_text(html, encoding="utf-8")
+        manifest["pages"].append({
+            "file": name,
+            "original_bytes": len(sources[name].encode("utf-8")),
+            "prerendered_bytes": len(prerendered[name][0].encode("utf-8")),
+            "built_bytes": len(html.encode("utf-8")),
+            "bundles": [f for (kind, ps), f in bundle_files.items() if name in ps],
+            "prerendered_math": prerendered[name][1],
+            "katex_scripts": "auto-render.min.js" in html,
+        })
+
+    for name in STATIC_FILES:
+        shutil.copy2(ROOT / name, out_dir / name)
+    for name in STATIC_DIRS:
+        if (out_dir / name).exists():
+            shutil.rmtree(out_dir / name)
+        shutil.copytree(ROOT / name, out_dir / name)
+
+    cached = [out_dir / page["file"] for page in manifest["pages"]]
+    cached += sorted(path for name in STATIC_DIRS for path in (out_dir / name).rglob("*") if path.is_file())
+    version = _content_hash("".join(path.read_text(encoding="utf-8") for path in cached))
+    precache = [page["file"] for page in manifest["pages"]] + [bundle["file"] for bundle in manifest["bundles"]]
+    worker = (ROOT / SERVICE_WORKER).read_text(encoding="utf-8")
+    worker = SW_VERSION_RE.sub(f"const CACHE_VERSION = '{version}';", worker)
+    worker = SW_BUILD_URLS_RE.sub(lambda _: "const BUILD_URLS = [\n" + ",\n".join(f"  '{url}'" for url in precache) + "\n];", worker)
+    (out_dir / SERVICE_WORKER).write_text(worker, encoding="utf-8")
+    manifest["service_worker"] = {"file": SERVICE_WORKER, "cache_version": version, "precache": precache}
+
+    with open(out_dir / "asset-manifest.json", "w") as f:
+        json.dump(manifest, f, indent=2)
+    return manifest
+
+
+def print_report(manifest):
+    print("\n" + "="*70)
+    print("  ASSET BUILD REPORT")
+    print("="*70)
+
+    print("\nShared bundles:")
+    for bundle in manifest["bundles"]:
+        print(f"  {bundle['file']:<32} {bundle['bytes']:>8,} B  "
+              f"{bundle['items']:>3} items  used by {len(bundle['pages'])} pages")
+
+    # Math pre-rendering grows the HTML and bundling shrinks it, so each step
+    # is reported against the size it started from
+    print("\nPer-page HTML:")
+    print(f"  {'page':<42} {'source':>9} {'math':>18} {'bundling':>17} {'built':>9}")
+    total_before = total_after = 0
+    for page in manifest["pages"]:
+        before, math, after = page["original_bytes"], page["prerendered_bytes"], page["built_bytes"]
+        total_before += before
+        total_after += after
+        print(f"  {page['file']:<42} {before:>9,} "
+              f"{math - before:>+9,} ({(math - before) / before * 100:>+5.0f}%) "
+              f"{after - math:>+8,} ({(after - math) / math * 100:>+5.1f}%) {after:>9,}")
+
+    print("\nPre-rendered math:")
+    for page in manifest["pages"]:
+        scripts = "kept for dynamic math" if page["katex_scripts"] else "dropped"
+        print(f"  {page['file']:<42} {page['prerendered_math']:>4} expressions, KaTeX scripts {scripts}")
+
+    worker = manifest["service_worker"]
+    print(f"\nService worker: {worker['file']} (cache version {worker['cache_version']}, "
+          f"{len(worker['precache'])} pages and bundles precached)")
+
+    shared = sum(b["bytes"] for b in manifest["bundles"])
+    print("\n" + "-"*70)
+    print(f"HTML total: {total_before:,} -> {total_after:,} B; shared bundles: {shared:,} B (cached once)")
+    print("-"*70)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--out", default="dist", help="output directory (default: dist)")
+    args = parser.parse_args()
+
+    manifest = build(ROOT / args.out)
+    print_report(manifest)
+    return 0
+
+
+if __name__ == "__main__":
+    exit(main())
@@ -24,9 +24,9 @@ function getPool() {
 }
 
 // Cloud function entry point for callFunction
-// Event format: { method: 'GET'|'POST'|'DELETE', uri, quote, comment, id }
+// Event format: { method: 'GET'|'POST'|'DELETE', uri, quote, comment, id, clientId }
 exports.main = async (event, context) => {
-  const { method, uri, quote, comment, id } = event;
+  const { method, uri, quote, comment, id, clientId } = event;
 
   console.log('Annotations function called:', { method, uri });
 
@@ -56,9 +56,11 @@ exports.main = async (event, context) => {
         return { success: false, error: 'Missing required fields: quote, comment, uri' };
       }
 
+      // A retry with the same clientId returns the existing row's id instead of inserting again
       const [result] = await pool.execute(
-        'INSERT INTO annotations (quote, comment, uri, createdAt) VALUES (?, ?, ?, NOW())',
-        [quote, comment, uri]
+        'INSERT INTO annotations (quote, comment, uri, clientId, createdAt) VALUES (?, ?, ?, ?, NOW()) ' +
+        'ON DUPLICATE KEY UPDATE id = LAST_INSERT_ID(id)',
+        [quote, comment, uri, clientId || null]
       );
 
       console.log('Insert result:', { insertId: result.insertId, affectedRows: result.affectedRows });
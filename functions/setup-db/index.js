@@ -21,8 +21,10 @@ exports.main = async (event, context) => {
         quote TEXT,
         comment TEXT,
         uri VARCHAR(500),
+        clientId VARCHAR(64) NULL,
         createdAt TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-        INDEX idx_uri (uri)
+        INDEX idx_uri (uri),
+        UNIQUE INDEX uniq_client_id (clientId)
       )
     `);
     results.push('Ensured table exists');
@@ -56,6 +58,15 @@ exports.main = async (event, context) => {
       results.push('Added index: idx_uri');
     }
 
+    // Client-generated id so a retried save doesn't insert a second row
+    if (!existingColumns.includes('clientId')) {
+      await connection.execute('ALTER TABLE annotations ADD COLUMN clientId VARCHAR(64) NULL');
+      results.push('Added column: clientId');
+
+      await connection.execute('ALTER TABLE annotations ADD UNIQUE INDEX uniq_client_id (clientId)');
+      results.push('Added index: uniq_client_id');
+    }
+
     await connection.end();
 
     return {
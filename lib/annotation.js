@@ -1,5 +1,5 @@
 // Simple Text Annotation System with MySQL Backend
-// Version: 3.0 - Uses CloudBase callFunction with MySQL
+// Version: 3.1 - Uses CloudBase callFunction with MySQL, queues writes made offline
 (function() {
   'use strict';
 
@@ -9,6 +9,18 @@
   const ENV_ID = 'test-3gop834c099077bf';
   let app = null;
 
+  // Offline support: last loaded annotations per page, and writes made offline
+  const CACHE_PREFIX = 'annotation-cache:';
+  const OUTBOX_KEY = 'annotation-outbox';
+  const LOCK_KEY = 'annotation-outbox-lock';
+  const LOCK_TTL_MS = 60000;
+  const TAB_ID = newClientId();
+  let flushing = null;   // in-flight outbox sync, shared by overlapping triggers
+
+  // navigator.onLine stays true on captive or congested Wi-Fi, so a call that
+  // hangs this long is treated like a dropped connection
+  const REQUEST_TIMEOUT_MS = 10000;
+
   // ============================================
   // State
   // ============================================
@@ -33,6 +45,132 @@
     return true;
   }
 
+  // Sent with every save so the server can ignore a retried write it already stored
+  function newClientId() {
+    if (window.crypto && crypto.randomUUID) return crypto.randomUUID();
+    return Date.now().toString(36) + '-' + Math.random().toString(36).slice(2);
+  }
+
+  // Resolves with the callFunction response; rejects only on transport
+  // failure (network error or timeout), never on a rejected write
+  function callAnnotations(data) {
+    let timer;
+    const timeout = new Promise((resolve, reject) => {
+      timer = setTimeout(() => reject(new Error('Request timed out')), REQUEST_TIMEOUT_MS);
+    });
+    return Promise.race([app.callFunction({ name: 'annotations', data: data }), timeout])
+      .finally(() => clearTimeout(timer));
+  }
+
+  // ============================================
+  // Offline Queue
+  // ============================================
+  function readOutbox() {
+    try {
+      return JSON.parse(localStorage.getItem(OUTBOX_KEY)) || [];
+    } catch (e) {
+      return [];
+    }
+  }
+
+  function pendingFor(uri) {
+    return readOutbox()
+      .filter(item => item.uri === uri)
+      .map((item, index) => ({ id: 'pending-' + index, ...item }));
+  }
+
+  function queueAnnotation(annotation) {
+    const outbox = readOutbox();
+    outbox.push(annotation);
+    localStorage.setItem(OUTBOX_KEY, JSON.stringify(outbox));
+
+    annotations.unshift({ id: 'pending-' + (outbox.length - 1), ...annotation, createdAt: new Date() });
+    renderAnnotations();
+    showNotification('Could not reach the server. Comment saved and will sync when the connection is back.');
+  }
+
+  function cacheAnnotation(annotation) {
+    const key = CACHE_PREFIX + annotation.uri;
+    let cached = [];
+    try {
+      cached = JSON.parse(localStorage.getItem(key)) || [];
+    } catch (e) {
+      cached = [];
+    }
+    cached.unshift(annotation);
+    localStorage.setItem(key, JSON.stringify(cached));
+  }
+
+  // The outbox is shared by every open unit page, so syncs are serialised
+  // across tabs; a tab that waited then finds the outbox already drained
+  function withOutboxLock(task) {
+    if (navigator.locks) return navigator.locks.request(OUTBOX_KEY, task);
+
+    // Older browsers: a fresh claim by another tab means it is already syncing
+    let claim = null;
+    try {
+      claim = JSON.parse(localStorage.getItem(LOCK_KEY));
+    } catch (e) {
+      claim = null;
+    }
+    if (claim && claim.owner !== TAB_ID && claim.until > Date.now()) return Promise.resolve();
+
+    localStorage.setItem(LOCK_KEY, JSON.stringify({ owner: TAB_ID, until: Date.now() + LOCK_TTL_MS }));
+    return task().finally(() => localStorage.removeItem(LOCK_KEY));
+  }
+
+  // Startup and 'online' events can overlap on a flaky reconnect; a second
+  // sync in the same tab just joins the running one
+  function flushOutbox() {
+    if (!flushing) {
+      flushing = withOutboxLock(sendOutbox).finally(() => { flushing = null; });
+    }
+    return flushing;
+  }
+
+  async function sendOutbox() {
+    const outbox = readOutbox();
+    if (outbox.length === 0 || !navigator.onLine || !initCloudBase()) return;
+
+    console.log('Syncing', outbox.length, 'offline annotations');
+    const handled = new Set();
+    for (const item of outbox) {
+      try {
+        const result = await callAnnotations({
+          method: 'POST', quote: item.quote, comment: item.comment, uri: item.uri, clientId: item.clientId
+        });
+        // A rejected write won't succeed on retry, so it is dropped
+        if (!(result.result && result.result.success)) {
+          console.error('Offline annotation rejected:', result.result?.error || 'Unknown error');
+        }
+      } catch (err) {
+        // The write may still have landed; its clientId makes the retry harmless
+        console.warn('Sync interrupted, will retry on the next load or reconnect:', err);
+        break;
+      }
+      handled.add(item.clientId);
+    }
+
+    // Writes queued while syncing stay in the outbox
+    localStorage.setItem(OUTBOX_KEY, JSON.stringify(readOutbox().filter(item => !handled.has(item.clientId))));
+    if (handled.size > 0) {
+      showNotification(`Synced ${handled.size} comment${handled.size === 1 ? '' : 's'} made offline`);
+      await loadAnnotations();
+    }
+  }
+
+  function loadCachedAnnotations(uri) {
+    let cached = [];
+    try {
+      cached = JSON.parse(localStorage.getItem(CACHE_PREFIX + uri)) || [];
+    } catch (e) {
+      cached = [];
+    }
+    annotations = pendingFor(uri).concat(cached);
+    console.log('Offline: showing', annotations.length, 'cached annotations');
+    renderAnnotations();
+  }
+
   // ============================================
   // API Operations
   // ============================================
@@ -40,16 +178,13 @@
     const uri = window.location.pathname;
     console.log('Loading annotations for URI:', uri);
 
-    if (!initCloudBase()) {
-      annotations = [];
+    if (!navigator.onLine || !initCloudBase()) {
+      loadCachedAnnotations(uri);
       return;
     }
 
     try {
-      const result = await app.callFunction({
-        name: 'annotations',
-        data: { method: 'GET', uri: uri }
-      });
+      const result = await callAnnotations({ method: 'GET', uri: uri });
 
       console.log('CloudBase response:', result);
 
@@ -59,66 +194,75 @@
       if (data && data.success) {
         annotations = data.data || [];
         console.log('Loaded', annotations.length, 'annotations');
+        localStorage.setItem(CACHE_PREFIX + uri, JSON.stringify(annotations));
+        annotations = pendingFor(uri).concat(annotations);
         renderAnnotations();
       } else {
         console.error('Failed to load annotations:', data?.error || 'Unknown error');
         annotations = [];
       }
     } catch (err) {
+      // Unreachable or timed out: show what was loaded last time
       console.error('Failed to load annotations:', err);
-      showNotification('Failed to load comments. Check console for details.', true);
-      annotations = [];
+      loadCachedAnnotations(uri);
     }
   }
 
   async function saveAnnotation(quote, comment, rangeData) {
     console.log('Saving annotation for quote:', quote.substring(0, 50) + '...');
 
-    if (!initCloudBase()) {
-      showNotification('CloudBase not initialized', true);
-      return;
-    }
-
     const newAnnotation = {
       quote: quote,
       comment: comment,
-      uri: window.location.pathname
+      uri: window.location.pathname,
+      clientId: newClientId()
     };
 
+    // No connection, or the SDK itself couldn't be fetched
+    if (!navigator.onLine || !initCloudBase()) {
+      queueAnnotation(newAnnotation);
+      return;
+    }
+
+    let result;
     try {
-      const result = await app.callFunction({
-        name: 'annotations',
-        data: {
-          method: 'POST',
-          quote: quote,
-          comment: comment,
-          uri: window.location.pathname
-        }
+      result = await callAnnotations({
+        method: 'POST',
+        quote: quote,
+        comment: comment,
+        uri: window.location.pathname,
+        clientId: newAnnotation.clientId
       });
-
-      console.log('Save response:', result);
-
-      // callFunction returns { result: <function return value> }
-      const data = result.result;
-
-      if (data && data.success) {
-        console.log('Database save successful, ID:', data.id);
-        // Add to local cache with the returned ID
-        annotations.unshift({
-          id: data.id,
-          ...newAnnotation,
-          createdAt: new Date()
-        });
-        console.log('Total annotations now:', annotations.length);
-        renderAnnotations();
-        console.log('Render complete');
-        showNotification('Comment saved successfully!');
-      } else {
-        throw new Error(data?.error || 'Save failed');
-      }
     } catch (err) {
-      console.error('Failed to save annotation:', err);
-      showNotification('Failed to save comment: ' + err.message, true);
+      // Any transport failure, including captive portals and timeouts; if the
+      // write did land, its clientId keeps the retry from adding a second row
+      console.warn('Save did not reach the server, queued:', err);
+      queueAnnotation(newAnnotation);
+      return;
+    }
+
+    console.log('Save response:', result);
+
+    // callFunction returns { result: <function return value> }
+    const data = result.result;
+
+    if (data && data.success) {
+      console.log('Database save successful, ID:', data.id);
+      // Add to local cache with the returned ID
+      const saved = {
+        id: data.id,
+        ...newAnnotation,
+        createdAt: new Date()
+      };
+      annotations.unshift(saved);
+      cacheAnnotation(saved);
+      console.log('Total annotations now:', annotations.length);
+      renderAnnotations();
+      console.log('Render complete');
+      showNotification('Comment saved successfully!');
+    } else {
+      console.error('Failed to save annotation:', data?.error || 'Save failed');
+      showNotification('Failed to save comment: ' + (data?.error || 'Save failed'), true);
     }
   }
 
@@ -540,8 +684,10 @@
   function init() {
     console.log('Initializing annotation system...');
 
-    // Load annotations from MySQL via CloudBase callFunction
+    // Load annotations from MySQL via CloudBase callFunction, then send
+    // anything written while offline
     loadAnnotations()
+      .then(flushOutbox)
       .then(() => {
         console.log('Annotation system initialized successfully');
       })
@@ -549,6 +695,8 @@
         console.error('Failed to initialize annotation system:', err);
       });
 
+    window.addEventListener('online', flushOutbox);
+
     // Text selection handler
     document.addEventListener('mouseup', function(e) {
       // Small delay to allow selection to complete
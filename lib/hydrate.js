@@ -0,0 +1,194 @@
+// Lazy Panel Hydration
+// Plotly graphs and KaTeX math inside a tab panel are set up the first time
+// the panel is shown or scrolled into view instead of all at page load.
+// Add ?hydrate=eager to the URL to hydrate every panel up front.
+(function() {
+  'use strict';
+
+  // ============================================
+  // State
+  // ============================================
+  let panelSelector = null;
+  let mathOptions = null;
+  const hydrated = new WeakSet();
+  const pendingPlots = new Map();   // plot element -> latest Plotly.newPlot arguments
+  const hiddenPlots = new Set();    // plots drawn while their panel was display:none
+
+  // Same elements auto-render skips; it only applies them to descendants
+  const NON_CONTENT_TAGS = new Set(['SCRIPT', 'STYLE', 'NOSCRIPT', 'TEMPLATE', 'TEXTAREA']);
+
+  const stats = {
+    mode: 'lazy',
+    hydratedPanels: [],
+    deferredPlots: 0,
+    drawnPlots: 0,
+    plotMs: 0,
+    mathMs: 0,
+    atLoad: null
+  };
+
+  function panelOf(el) {
+    return panelSelector && el && el.closest ? el.closest(panelSelector) : null;
+  }
+
+  function isShown(el) {
+    return el.getClientRects().length > 0;
+  }
+
+  // ============================================
+  // Plotly Deferral
+  // ============================================
+  function wrapPlotly() {
+    if (typeof Plotly === 'undefined' || Plotly.newPlot.deferred) return;
+
+    const newPlot = Plotly.newPlot;
+    Plotly.newPlot = function(target, ...args) {
+      const el = typeof target === 'string' ? document.getElementById(target) : target;
+      const panel = panelOf(el);
+
+      // Keep only the latest call so theme changes before hydration still apply
+      if (panel && !hydrated.has(panel)) {
+        if (!pendingPlots.has(el)) stats.deferredPlots++;
+        pendingPlots.set(el, args);
+        return Promise.resolve(el);
+      }
+
+      const start = performance.now();
+      const result = newPlot.call(Plotly, target, ...args);
+      stats.plotMs += performance.now() - start;
+      stats.drawnPlots++;
+      if (panel && !isShown(panel)) hiddenPlots.add(el);
+      return result;
+    };
+    Plotly.newPlot.deferred = true;
+  }
+
+  // ============================================
+  // Math Rendering
+  // ============================================
+  function renderMath(root) {
+    // build.py typesets static math ahead of time
+    if (!mathOptions || document.body.hasAttribute('data-katex-prerendered')) return;
+    if (typeof renderMathInElement === 'undefined') return;
+
+    const start = performance.now();
+    renderMathInElement(root, mathOptions);
+    stats.mathMs += performance.now() - start;
+  }
+
+  function renderMathOutsidePanels(root) {
+    Array.from(root.children).forEach(child => {
+      if (NON_CONTENT_TAGS.has(child.tagName) || child.matches(panelSelector)) return;
+      if (child.querySelector(panelSelector)) {
+        renderMathOutsidePanels(child);
+      } else {
+        renderMath(child);
+      }
+    });
+  }
+
+  // ============================================
+  // Hydration
+  // ============================================
+  function hydrate(panel) {
+    if (hydrated.has(panel)) return;
+    hydrated.add(panel);
+    stats.hydratedPanels.push(panel.id);
+
+    pendingPlots.forEach((args, el) => {
+      if (panel.contains(el)) {
+        pendingPlots.delete(el);
+        Plotly.newPlot(el, ...args);
+      }
+    });
+    renderMath(panel);
+  }
+
+  function prefetchAfter(panel) {
+    const panels = Array.from(document.querySelectorAll(panelSelector));
+    const next = panels[panels.indexOf(panel) + 1];
+    if (!next || hydrated.has(next)) return;
+
+    const idle = window.requestIdleCallback || (cb => setTimeout(cb, 200));
+    idle(() => hydrate(next), { timeout: 2000 });
+  }
+
+  function onShown(panel) {
+    hydrate(panel);
+
+    // Plots prefetched into a hidden panel were sized without a layout
+    hiddenPlots.forEach(el => {
+      if (panel.contains(el)) {
+        hiddenPlots.delete(el);
+        Plotly.Plots.resize(el).catch(() => {});
+      }
+    });
+
+    prefetchAfter(panel);
+  }
+
+  function watch(panels) {
+    const classObserver = new MutationObserver(records => {
+      records.forEach(record => {
+        if (record.target.classList.contains('active')) onShown(record.target);
+      });
+    });
+
+    const viewObserver = 'IntersectionObserver' in window
+      ? new IntersectionObserver(entries => {
+          entries.forEach(entry => {
+            if (entry.isIntersecting) onShown(entry.target);
+          });
+        })
+      : null;
+
+    panels.forEach(panel => {
+      classObserver.observe(panel, { attributes: true, attributeFilter: ['class'] });
+      if (viewObserver) viewObserver.observe(panel);
+    });
+  }
+
+  // ============================================
+  // Public API
+  // ============================================
+  function init(options) {
+    panelSelector = options.panels;
+    mathOptions = options.math || null;
+    stats.mode = new URLSearchParams(window.location.search).get('hydrate') === 'eager' ? 'eager' : 'lazy';
+    wrapPlotly();
+
+    const start = () => {
+      const panels = Array.from(document.querySelectorAll(panelSelector));
+      renderMathOutsidePanels(document.body);
+
+      if (stats.mode === 'eager') {
+        panels.forEach(hydrate);
+      } else {
+        panels.filter(p => p.classList.contains('active')).forEach(onShown);
+      }
+      watch(panels);
+    };
+
+    if (document.readyState === 'loading') {
+      document.addEventListener('DOMContentLoaded', start);
+    } else {
+      start();
+    }
+  }
+
+  window.addEventListener('load', () => {
+    stats.atLoad = {
+      drawnPlots: stats.drawnPlots,
+      deferredPlots: pendingPlots.size,
+      workMs: stats.plotMs + stats.mathMs
+    };
+  });
+
+  window.PanelHydration = {
+    init: init,
+    hydrate: hydrate,
+    stats: () => Object.assign({}, stats, {
+      pendingPanels: Array.from(new Set(Array.from(pendingPlots.keys()).map(el => panelOf(el).id)))
+    })
+  };
+})();
@@ -0,0 +1,148 @@
+// Offline Cache Service Worker
+// Precaches the pinned CDN libraries and the annotation client, serves the
+// unit pages stale-while-revalidate, and falls back to the cache whenever
+// the network is unavailable. build.py stamps CACHE_VERSION on every build.
+'use strict';
+
+// ============================================
+// Configuration
+// ============================================
+const CACHE_VERSION = 'dev';
+
+// Versioned URLs never change, so this cache only rotates with the versions
+const VENDOR_CACHE = 'vendor-katex@0.16.9-plotly@2.27.0-mathjs@12.2.1';
+const STATIC_CACHE = `static-${CACHE_VERSION}`;
+
+// Must match the <script>/<link> tags in the unit pages
+const VENDOR_URLS = [
+  'https://cdn.jsdelivr.net/npm/katex@0.16.9/dist/katex.min.css',
+  'https://cdn.jsdelivr.net/npm/katex@0.16.9/dist/katex.min.js',
+  'https://cdn.jsdelivr.net/npm/katex@0.16.9/dist/contrib/auto-render.min.js',
+  'https://cdn.plot.ly/plotly-2.27.0.min.js',
+  'https://cdnjs.cloudflare.com/ajax/libs/mathjs/12.2.1/math.min.js'
+];
+
+const LOCAL_URLS = [
+  'lib/annotation.css',
+  'lib/annotation.js',
+  'lib/hydrate.js'
+];
+
+// Unit pages and their hashed bundles, written by build.py. Activation drops
+// the previous STATIC_CACHE, so every page must be re-cached on install to
+// stay available offline after a deploy.
+const BUILD_URLS = [];
+
+// KaTeX fonts and Google Fonts files live under versioned or hashed URLs
+const IMMUTABLE_PREFIXES = [
+  'https://cdn.jsdelivr.net/npm/katex@0.16.9/',
+  'https://fonts.gstatic.com/'
+];
+
+// The CloudBase SDK is loaded from its "latest" URL, so it is refreshed
+// in the background like the pages instead of being precached
+const REVALIDATED_PREFIXES = [
+  'https://static.cloudbase.net/cloudbase-js-sdk/',
+  'https://fonts.googleapis.com/'
+];
+
+// ============================================
+// Lifecycle
+// ============================================
+self.addEventListener('install', event => {
+  event.waitUntil((async () => {
+    const local = await caches.open(STATIC_CACHE);
+    await local.addAll(LOCAL_URLS.concat(BUILD_URLS));
+
+    // A CDN hiccup shouldn't block install; misses are cached on first use
+    const vendor = await caches.open(VENDOR_CACHE);
+    await Promise.allSettled(VENDOR_URLS.map(async url => {
+      if (await vendor.match(url)) return;
+      const response = await fetch(new Request(url, { mode: 'cors' }));
+      if (response.ok) await vendor.put(url, response);
+    }));
+
+    await self.skipWaiting();
+  })());
+});
+
+self.addEventListener('activate', event => {
+  event.waitUntil((async () => {
+    const keep = [VENDOR_CACHE, STATIC_CACHE];
+    const names = await caches.keys();
+    await Promise.all(names.filter(name => !keep.includes(name)).map(name => caches.delete(name)));
+    await self.clients.claim();
+  })());
+});
+
+// ============================================
+// Strategies
+// ============================================
+function cacheable(response) {
+  return response.ok || response.type === 'opaque';
+}
+
+// Page <script> and <link> tags make no-cors requests whose opaque responses
+// hide the status; asking for CORS lets only real successes into the cache
+function corsRequest(request) {
+  return request.mode === 'no-cors' ? new Request(request.url, { mode: 'cors', credentials: 'omit' }) : request;
+}
+
+// Only for URLs whose content never changes: a cached error page or captive
+// portal response would be served for good
+async function cacheFirst(request, cacheName) {
+  const cached = await caches.match(request);
+  if (cached) return cached;
+
+  const response = await fetch(request);
+  if (response.ok) {
+    const cache = await caches.open(cacheName);
+    await cache.put(request, response.clone());
+  }
+  return response;
+}
+
+function staleWhileRevalidate(event, cacheName, matchOptions) {
+  const request = event.request;
+  const update = fetch(request).then(async response => {
+    if (cacheable(response)) {
+      const cache = await caches.open(cacheName);
+      await cache.put(request, response.clone());
+    }
+    return response;
+  });
+  // Keep the worker alive until the background refresh has been stored
+  event.waitUntil(update.catch(() => {}));
+
+  return caches.match(request, matchOptions).then(cached => cached || update);
+}
+
+// ============================================
+// Routing
+// ============================================
+self.addEventListener('fetch', event => {
+  const request = event.request;
+  if (request.method !== 'GET') return;   // annotation writes go straight to CloudBase
+
+  const url = new URL(request.url);
+  const href = url.href;
+
+  if (url.origin === self.location.origin) {
+    if (request.mode === 'navigate' || url.pathname.endsWith('.html')) {
+      // ?hydrate=eager and similar only change client-side behaviour
+      event.respondWith(staleWhileRevalidate(event, STATIC_CACHE, { ignoreSearch: true }));
+    } else if (url.pathname.startsWith('/assets/')) {
+      event.respondWith(cacheFirst(request, STATIC_CACHE));   // content-hashed by build.py
+    } else if (url.pathname.startsWith('/lib/')) {
+      event.respondWith(staleWhileRevalidate(event, STATIC_CACHE));
+    }
+    return;
+  }
+
+  if (VENDOR_URLS.includes(href) || IMMUTABLE_PREFIXES.some(prefix => href.startsWith(prefix))) {
+    // A CDN without CORS headers still loads the file, just uncached
+    event.respondWith(cacheFirst(corsRequest(request), VENDOR_CACHE).catch(() => fetch(request)));
+  } else if (REVALIDATED_PREFIXES.some(prefix => href.startsWith(prefix))) {
+    event.respondWith(staleWhileRevalidate(event, STATIC_CACHE));
+  }
+});
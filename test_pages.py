@@ -5,9 +5,18 @@ Tests every interactive element, animation, and content thoroughly
 """
 
 from playwright.sync_api import sync_playwright
+import argparse
 import time
 import json
 import re
+import io
+import os
+
+try:
+    import numpy as np
+    from PIL import Image
+except ImportError:  # only needed for --visual
+    np = Image = None
 
 BASE_URL = "http://localhost:8080"
 
@@ -62,6 +71,82 @@ PAGES = [
     },
 ]
 
+# Device/network profiles for load-time measurements (Chrome DevTools presets).
+# Throughput is in kbit/s; latency is the added round trip in ms.
+PROFILES = [
+    {
+        "name": "desktop",
+        "viewport": {"width": 1280, "height": 800},
+        "mobile": False,
+        "cpu_slowdown": 1,
+        "network": None
+    },
+    {
+        "name": "mid-tier-mobile",
+        "viewport": {"width": 412, "height": 915},
+        "mobile": True,
+        "cpu_slowdown": 4,
+        "network": {"label": "slow 4G", "latency": 562.5, "download_kbps": 1440, "upload_kbps": 675}
+    },
+    {
+        "name": "low-end-mobile",
+        "viewport": {"width": 360, "height": 640},
+        "mobile": True,
+        "cpu_slowdown": 6,
+        "network": {"label": "3G", "latency": 2000, "download_kbps": 400, "upload_kbps": 400}
+    },
+]
+
+# Collects long tasks from the very start of each navigation
+LONG_TASK_OBSERVER = """
+    window.__longTasks = [];
+    new PerformanceObserver(list => {
+        list.getEntries().forEach(e => window.__longTasks.push({ start: e.startTime, duration: e.duration }));
+    }).observe({ type: 'longtask', buffered: true });
+"""
+
+# Visual regression: every tab is captured per theme and viewport and compared
+# to visual_baselines/ by size and perceptual hash; only hashes past the
+# threshold get a full pixel diff, written to visual_diffs/ when it fails.
+VISUAL_BASELINE_DIR = "visual_baselines"
+VISUAL_DIFF_DIR = "visual_diffs"
+VISUAL_THEMES = ["light", "dark"]
+VISUAL_VIEWPORTS = {
+    "desktop": {"width": 1280, "height": 800},
+    "mobile": {"width": 412, "height": 915}
+}
+HASH_SIZE = 16           # hash grid is HASH_SIZE x HASH_SIZE blocks, 2 bits per block
+HASH_THRESHOLD = 12      # Hamming distance (of 512 bits) that triggers a pixel diff
+PIXEL_TOLERANCE = 24     # per-channel difference ignored as anti-aliasing noise
+PIXEL_DIFF_LIMIT = 0.002 # fraction of changed pixels that fails a screenshot
+
+# Records requestAnimationFrame deltas and long tasks between start() and stop()
+FRAME_SAMPLER = """
+    window.__frameSampler = (() => {
+        let frames = [], tasks = [], last = null, running = false, started = 0;
+        const tick = now => {
+            if (!running) return;
+            if (last !== null) frames.push(now - last);
+            last = now;
+            requestAnimationFrame(tick);
+        };
+        new PerformanceObserver(list => {
+            if (running) list.getEntries().forEach(e => tasks.push(e.duration));
+        }).observe({ type: 'longtask' });
+        return {
+            start() { frames = []; tasks = []; last = null; running = true; started = performance.now(); requestAnimationFrame(tick); },
+            stop() { running = false; return { frames, longTasks: tasks, duration: performance.now() - started }; }
+        };
+    })();
+"""
+
+FRAME_MS = 1000 / 60
+# Frame budgets per widget kind; a "U1.x/<widget>" key overrides its kind's budget
+FRAME_BUDGETS = {
+    "steps": {"min_fps": 50, "max_dropped": 6, "worst_frame_ms": 100},
+    "graphs": {"min_fps": 30, "max_dropped": 30, "worst_frame_ms": 250}
+}
+
 
 def test_page_thoroughly(page, config):
     """Run comprehensive tests on a single page"""
@@ -264,6 +349,33 @@ def test_page_thoroughly(page, config):
             results["failed"].append(f"4.3 Found {len(katex_errors)} KaTeX errors")
             print(f"  [FAIL] 4.3 KaTeX errors: {len(katex_errors)}")
 
+        # Test 4.4: Raw LaTeX anywhere in the DOM, including hidden tabs that innerText skips
+        raw_math = page.evaluate("""
+            () => {
+                const skip = new Set(['SCRIPT', 'NOSCRIPT', 'STYLE', 'TEXTAREA', 'PRE', 'CODE', 'OPTION', 'ANNOTATION']);
+                const walker = document.createTreeWalker(document.body, NodeFilter.SHOW_TEXT);
+                let count = 0;
+                while (walker.nextNode()) {
+                    const parent = walker.currentNode.parentElement;
+                    if (parent && skip.has(parent.tagName.toUpperCase())) continue;
+                    count += (walker.currentNode.textContent.match(/\\\\[\\(\\[]/g) || []).length;
+                }
+                return count;
+            }
+        """)
+
+        if raw_math == 0:
+            results["passed"].append("4.4 No raw LaTeX in any panel")
+            print("  [PASS] 4.4 No raw LaTeX in any panel")
+        else:
+            results["failed"].append(f"4.4 Found {raw_math} raw LaTeX delimiters")
+            print(f"  [FAIL] 4.4 Raw LaTeX delimiters: {raw_math}")
+
+        # Test 4.5: Whether math arrived pre-rendered from build.py
+        prerendered = page.evaluate("document.body.hasAttribute('data-katex-prerendered')")
+        results["info"].append(f"4.5 Math pre-rendered at build time: {prerendered}")
+        print(f"  [INFO] 4.5 Pre-rendered: {prerendered}")
+
     except Exception as e:
         results["failed"].append(f"4.0 KaTeX test error: {str(e)[:100]}")
         print(f"  [FAIL] 4.0 KaTeX test error: {str(e)[:50]}")
@@ -565,6 +677,68 @@ def test_page_thoroughly(page, config):
             results["info"].append("9.2 No Plotly plots (may initialize on demand)")
             print("  [INFO] 9.2 No Plotly plots detected")
 
+        # Test 9.3: Fresh load leaves plots in hidden tabs to lib/hydrate.js
+        page.goto(url, wait_until="networkidle", timeout=30000)
+        time.sleep(1)
+        lazy_stats = page.evaluate("window.PanelHydration ? PanelHydration.stats() : null")
+
+        if lazy_stats is None:
+            results["warnings"].append("9.3 Lazy hydration not installed")
+            print("  [WARN] 9.3 PanelHydration not found")
+        elif lazy_stats["deferredPlots"] == 0:
+            results["info"].append("9.3 No plots deferred at load (all plots in the initial tab)")
+            print("  [INFO] 9.3 No plots deferred at load")
+        else:
+            results["passed"].append(f"9.3 Deferred {lazy_stats['deferredPlots']} plots at load")
+            print(f"  [PASS] 9.3 Deferred plots: {lazy_stats['deferredPlots']}, "
+                  f"pending tabs: {lazy_stats['pendingPanels']}")
+
+        if lazy_stats:
+            # Test 9.4: Every pending tab draws its plots once activated
+            tabs = page.query_selector_all(".nav-tab")
+            missing = []
+            for panel_id in lazy_stats["pendingPanels"]:
+                if panel_id not in config["section_ids"]:
+                    continue
+                tabs[config["section_ids"].index(panel_id)].click()
+                time.sleep(0.5)
+                drawn = page.evaluate(f"""
+                    () => ({{
+                        plots: document.querySelectorAll('#{panel_id} .js-plotly-plot').length,
+                        pending: PanelHydration.stats().pendingPanels.includes('{panel_id}')
+                    }})
+                """)
+                if drawn["plots"] == 0 or drawn["pending"]:
+                    missing.append(panel_id)
+
+            if not missing:
+                results["passed"].append(f"9.4 Plots appear after activation: {len(lazy_stats['pendingPanels'])} tabs")
+                print(f"  [PASS] 9.4 Plots drawn on activation in {len(lazy_stats['pendingPanels'])} tabs")
+            else:
+                results["failed"].append(f"9.4 Plots missing after activation: {missing}")
+                print(f"  [FAIL] 9.4 Plots missing after activation: {missing}")
+
+            # Test 9.5: Load-time work saved against hydrating every tab up front
+            timings = {}
+            for mode, query in (("eager", "?hydrate=eager"), ("lazy", "")):
+                page.goto(f"{url}{query}", wait_until="networkidle", timeout=30000)
+                timings[mode] = page.evaluate("""
+                    () => ({
+                        load: performance.getEntriesByType('navigation')[0].loadEventEnd,
+                        work: PanelHydration.stats().atLoad
+                    })
+                """)
+
+            eager, lazy = timings["eager"], timings["lazy"]
+            saved_ms = eager["work"]["workMs"] - lazy["work"]["workMs"]
+            results["info"].append(
+                f"9.5 Load work: eager {eager['work']['workMs']:.0f}ms/{eager['work']['drawnPlots']} plots, "
+                f"lazy {lazy['work']['workMs']:.0f}ms/{lazy['work']['drawnPlots']} plots (saved {saved_ms:.0f}ms); "
+                f"load event {eager['load']:.0f}ms -> {lazy['load']:.0f}ms"
+            )
+            print(f"  [INFO] 9.5 Load work saved: {saved_ms:.0f}ms "
+                  f"(load event {eager['load']:.0f}ms -> {lazy['load']:.0f}ms)")
+
     except Exception as e:
         results["warnings"].append(f"9.0 Graph test error: {str(e)[:100]}")
         print(f"  [WARN] 9.0 Graph error: {str(e)[:50]}")
@@ -750,8 +924,609 @@ def test_page_thoroughly(page, config):
     return results
 
 
+def test_repeat_visits(browser):
+    """Check warm loads through the service worker and that every page works offline"""
+    results = {
+        "page": "Repeat visits (service worker)",
+        "passed": [],
+        "failed": [],
+        "warnings": [],
+        "info": []
+    }
+
+    print(f"\n{'='*70}")
+    print("  TESTING: Repeat visits and offline use (sw.js)")
+    print(f"{'='*70}")
+
+    load_time = """
+        () => {
+            const nav = performance.getEntriesByType('navigation')[0];
+            const resources = performance.getEntriesByType('resource');
+            return {
+                load: nav.loadEventEnd,
+                from_worker: resources.filter(r => r.workerStart > 0).length,
+                resources: resources.length
+            };
+        }
+    """
+
+    # Fresh context so the first visit is a real cold load with no worker installed
+    context = browser.new_context(viewport={"width": 1280, "height": 800})
+    page = context.new_page()
+
+    try:
+        # Test 16.1: Service worker installs from a unit page
+        cold = {}
+        for config in PAGES:
+            page.goto(f"{BASE_URL}/{config['file']}", wait_until="networkidle", timeout=60000)
+            cold[config["file"]] = page.evaluate(load_time)
+            page.evaluate("() => navigator.serviceWorker.ready")
+
+        controlled = page.evaluate("() => !!navigator.serviceWorker.controller")
+        if controlled:
+            results["passed"].append("16.1 Service worker installed and controlling pages")
+            print("  [PASS] 16.1 Service worker controls the unit pages")
+        else:
+            results["failed"].append("16.1 Service worker not controlling pages")
+            print("  [FAIL] 16.1 Service worker not controlling pages")
+
+        # Test 16.2: Warm loads come from the cache and are faster
+        print("\n--- Warm loads ---")
+        slower = []
+        for config in PAGES:
+            page.goto(f"{BASE_URL}/{config['file']}", wait_until="networkidle", timeout=60000)
+            warm = page.evaluate(load_time)
+            before = cold[config["file"]]
+            results["info"].append(
+                f"16.2 {config['file']}: load {before['load']:.0f}ms -> {warm['load']:.0f}ms, "
+                f"{warm['from_worker']}/{warm['resources']} resources via service worker"
+            )
+            print(f"  [INFO] 16.2 {config['file'][:40]:<40} {before['load']:>6.0f}ms -> {warm['load']:>6.0f}ms "
+                  f"({warm['from_worker']}/{warm['resources']} via worker)")
+            if warm["load"] > before["load"]:
+                slower.append(config["file"])
+
+        if not slower:
+            results["passed"].append("16.2 Warm loads faster than cold loads on every page")
+            print("  [PASS] 16.2 Warm loads faster on every page")
+        else:
+            results["warnings"].append(f"16.2 Warm load not faster: {slower}")
+            print(f"  [WARN] 16.2 Warm load not faster: {slower}")
+
+        # Test 16.3: Every page still works with the network disabled
+        print("\n--- Offline ---")
+        context.set_offline(True)
+        broken = []
+        for config in PAGES:
+            try:
+                page.goto(f"{BASE_URL}/{config['file']}", wait_until="load", timeout=30000)
+                time.sleep(1)
+                tabs = page.query_selector_all(".nav-tab")
+                if len(tabs) > 1:
+                    tabs[1].click()
+                    time.sleep(0.5)
+                state = page.evaluate(f"""
+                    () => ({{
+                        plotly: typeof Plotly !== 'undefined',
+                        math: document.querySelectorAll('.katex').length,
+                        tabSwitched: !!document.querySelector('#{config["section_ids"][1]}.active'),
+                        annotations: typeof cloudbase !== 'undefined'
+                    }})
+                """)
+            except Exception as e:
+                state = {"error": str(e)[:60]}
+
+            ok = state.get("plotly") and state.get("math") and state.get("tabSwitched")
+            if ok:
+                print(f"  [PASS] 16.3 {config['file'][:40]:<40} offline: {state['math']} math, Plotly loaded, tabs work")
+            else:
+                broken.append(config["file"])
+                print(f"  [FAIL] 16.3 {config['file'][:40]:<40} offline: {state}")
+            if ok and not state["annotations"]:
+                results["warnings"].append(f"16.3 CloudBase SDK not cached for {config['file']}")
+
+        if not broken:
+            results["passed"].append(f"16.3 All {len(PAGES)} pages work offline")
+        else:
+            results["failed"].append(f"16.3 Pages broken offline: {broken}")
+
+    except Exception as e:
+        results["warnings"].append(f"16.0 Repeat visit error: {str(e)[:100]}")
+        print(f"  [WARN] 16.0 Repeat visit error: {str(e)[:50]}")
+
+    context.close()
+    return results
+
+
+def new_profile_context(browser, profile, throttle_network=True):
+    """Create a browser context with the profile's viewport and return (context, page, cdp)"""
+    # Service workers are blocked so every page in the matrix is a cold load
+    context = browser.new_context(
+        viewport=profile["viewport"],
+        service_workers="block",
+        is_mobile=profile["mobile"],
+        has_touch=profile["mobile"],
+        device_scale_factor=2 if profile["mobile"] else 1
+    )
+    context.add_init_script(LONG_TASK_OBSERVER)
+    page = context.new_page()
+
+    cdp = context.new_cdp_session(page)
+    cdp.send("Network.enable")
+    cdp.send("Network.setCacheDisabled", {"cacheDisabled": True})
+    if profile["network"] and throttle_network:
+        net = profile["network"]
+        cdp.send("Network.emulateNetworkConditions", {
+            "offline": False,
+            "latency": net["latency"],
+            "downloadThroughput": net["download_kbps"] * 1000 / 8,
+            "uploadThroughput": net["upload_kbps"] * 1000 / 8
+        })
+    cdp.send("Emulation.setCPUThrottlingRate", {"rate": profile["cpu_slowdown"]})
+
+    return context, page, cdp
+
+
+def measure_page_under_profile(page, config):
+    """Cold-load a page in an already throttled context and time load and interactions"""
+    url = f"{BASE_URL}/{config['file']}"
+    metrics = {"page": config["file"]}
+
+    try:
+        page.goto(url, wait_until="load", timeout=180000)
+        page.wait_for_load_state("networkidle", timeout=180000)
+
+        metrics["load"] = page.evaluate("""
+            () => {
+                const nav = performance.getEntriesByType('navigation')[0];
+                const fcp = performance.getEntriesByName('first-contentful-paint')[0];
+                const resources = performance.getEntriesByType('resource');
+                const tasks = window.__longTasks || [];
+                return {
+                    ttfb: nav.responseStart,
+                    fcp: fcp ? fcp.startTime : null,
+                    dom_content_loaded: nav.domContentLoadedEventEnd,
+                    load: nav.loadEventEnd,
+                    transfer_kb: (nav.transferSize + resources.reduce((sum, r) => sum + (r.transferSize || 0), 0)) / 1024,
+                    requests: resources.length + 1,
+                    long_tasks: tasks.length,
+                    total_blocking_ms: tasks.reduce((sum, t) => sum + Math.max(0, t.duration - 50), 0)
+                };
+            }
+        """)
+
+        # Click to next paint, measured in-page so driver round trips don't count
+        metrics["interaction"] = page.evaluate("""
+            async () => {
+                const nextPaint = () => new Promise(r => requestAnimationFrame(() => setTimeout(r, 0)));
+                const timeClick = async el => {
+                    const start = performance.now();
+                    el.click();
+                    await nextPaint();
+                    return performance.now() - start;
+                };
+
+                const tabs = Array.from(document.querySelectorAll('.nav-tab'));
+                const tabTimes = [];
+                for (const tab of tabs.slice(1).concat(tabs.slice(0, 1))) {
+                    tabTimes.push(await timeClick(tab));
+                }
+
+                const themeBtn = document.querySelector('.theme-toggle');
+                const themeTimes = [];
+                if (themeBtn) {
+                    themeTimes.push(await timeClick(themeBtn));
+                    themeTimes.push(await timeClick(themeBtn));
+                }
+
+                const sorted = tabTimes.slice().sort((a, b) => a - b);
+                return {
+                    tab_switch_median: sorted.length ? sorted[Math.floor(sorted.length / 2)] : null,
+                    tab_switch_max: sorted.length ? sorted[sorted.length - 1] : null,
+                    theme_toggle_max: themeTimes.length ? Math.max(...themeTimes) : null
+                };
+            }
+        """)
+
+    except Exception as e:
+        metrics["error"] = str(e)[:100]
+
+    return metrics
+
+
+def run_profile_matrix(browser, profiles):
+    """Measure every page under every profile, one throttled context per profile"""
+    matrix = []
+
+    for profile in profiles:
+        net = profile["network"]["label"] if profile["network"] else "unthrottled"
+        print(f"\n{'='*70}")
+        print(f"  PROFILE: {profile['name']} ({profile['cpu_slowdown']}x CPU, {net})")
+        print(f"{'='*70}")
+
+        context, page, _ = new_profile_context(browser, profile)
+        for config in PAGES:
+            metrics = measure_page_under_profile(page, config)
+            metrics["profile"] = profile["name"]
+            matrix.append(metrics)
+
+            if "error" in metrics:
+                print(f"  [WARN] {config['file']}: {metrics['error'][:60]}")
+                continue
+
+            load, inter = metrics["load"], metrics["interaction"]
+            fcp = f"{load['fcp']:.0f}ms" if load["fcp"] is not None else "n/a"
+            print(f"  {config['file'][:40]:<40} FCP {fcp:>7}  load {load['load']:>6.0f}ms  "
+                  f"TBT {load['total_blocking_ms']:>5.0f}ms  tab {inter['tab_switch_median'] or 0:>4.0f}ms")
+        context.close()
+
+    return matrix
+
+
+def load_pixels(png):
+    """Decode PNG bytes into an RGB array of shape (height, width, 3)"""
+    return np.asarray(Image.open(io.BytesIO(png)).convert("RGB"), dtype=np.int16)
+
+
+def perceptual_hash(pixels):
+    """Hash an RGB array from block means over a fixed grid (difference + average hash)"""
+    gray = pixels @ np.array([0.299, 0.587, 0.114])
+    rows, cols = HASH_SIZE, HASH_SIZE + 1
+    bh, bw = gray.shape[0] // rows, gray.shape[1] // cols
+    blocks = gray[:bh * rows, :bw * cols].reshape(rows, bh, cols, bw).mean(axis=(1, 3))
+
+    # The +1 margin keeps flat regions (most of a white page) from flipping on noise
+    gradient = blocks[:, 1:] > blocks[:, :-1] + 1
+    average = blocks[:, :-1] > blocks[:, :-1].mean()
+    return np.packbits(np.concatenate([gradient.ravel(), average.ravel()])).tobytes().hex()
+
+
+def hash_distance(a, b):
+    """Hamming distance between two hex perceptual hashes"""
+    xor = np.frombuffer(bytes.fromhex(a), np.uint8) ^ np.frombuffer(bytes.fromhex(b), np.uint8)
+    return int(np.unpackbits(xor).sum())
+
+
+def pixel_diff(current, baseline):
+    """Return (changed fraction, diff image) for two RGB arrays, or (None, None) if sizes differ"""
+    if current.shape != baseline.shape:
+        return None, None
+
+    changed = np.abs(current - baseline).max(axis=2) > PIXEL_TOLERANCE
+    overlay = (baseline * 0.3 + 178).astype(np.uint8)
+    overlay[changed] = (255, 0, 0)
+    return float(changed.mean()), overlay
+
+
+def capture_tabs(page, config):
+    """Yield (section id, PNG bytes) for every tab panel of the loaded page"""
+    tabs = page.query_selector_all(".nav-tab")
+    for index, section_id in enumerate(config["section_ids"]):
+        if index >= len(tabs):
+            break
+        tabs[index].click()
+        page.wait_for_function(f"""
+            () => !window.PanelHydration || !PanelHydration.stats().pendingPanels.includes('{section_id}')
+        """, timeout=10000)
+        time.sleep(0.5)  # let Plotly transitions and resizes settle
+        yield section_id, page.locator(f"#{section_id}").screenshot(animations="disabled", caret="hide")
+
+
+def baseline_entry(pixels):
+    """Hash and size stored per screenshot in hashes.json"""
+    return {"hash": perceptual_hash(pixels), "size": [pixels.shape[1], pixels.shape[0]]}
+
+
+def save_failure(key, png, overlay=None):
+    """Keep a failing screenshot, and its diff overlay if there is one, in VISUAL_DIFF_DIR"""
+    out = os.path.join(VISUAL_DIFF_DIR, key)
+    os.makedirs(os.path.dirname(out), exist_ok=True)
+    with open(out + ".png", "wb") as f:
+        f.write(png)
+    if overlay is not None:
+        Image.fromarray(overlay).save(out + ".diff.png")
+
+
+def compare_screenshot(key, png, baselines):
+    """Compare one screenshot with its baseline; returns a result dict"""
+    pixels = load_pixels(png)
+    result = {"key": key, **baseline_entry(pixels)}
+
+    if key not in baselines:
+        result["status"] = "new"
+        return result
+
+    # The hash is a fixed grid and can't see a panel growing or shrinking
+    baseline = baselines[key]
+    if result["size"] != baseline["size"]:
+        result["status"] = "fail"
+        result["reason"] = "size changed {}x{} -> {}x{}".format(*baseline["size"], *result["size"])
+        save_failure(key, png)
+        return result
+
+    result["distance"] = hash_distance(result["hash"], baseline["hash"])
+    if result["distance"] <= HASH_THRESHOLD:
+        result["status"] = "pass"
+        return result
+
+    # Hash moved: confirm with a full pixel diff against the stored image
+    baseline_png = os.path.join(VISUAL_BASELINE_DIR, key + ".png")
+    if not os.path.exists(baseline_png):
+        result["status"] = "fail"
+        result["reason"] = "baseline image missing"
+        save_failure(key, png)
+        return result
+
+    with open(baseline_png, "rb") as f:
+        ratio, overlay = pixel_diff(pixels, load_pixels(f.read()))
+
+    result["changed"] = ratio
+    if ratio is not None and ratio <= PIXEL_DIFF_LIMIT:
+        result["status"] = "pass"
+        return result
+
+    result["status"] = "fail"
+    result["reason"] = "baseline image size differs" if ratio is None else f"{ratio:.2%} pixels changed"
+    save_failure(key, png, overlay)
+    return result
+
+
+def run_visual_regression(browser, update=False):
+    """Screenshot every tab per theme and viewport and check it against the baselines"""
+    hash_file = os.path.join(VISUAL_BASELINE_DIR, "hashes.json")
+    baselines = {}
+    if os.path.exists(hash_file):
+        with open(hash_file) as f:
+            baselines = json.load(f)
+
+    print(f"\n{'='*70}")
+    print(f"  VISUAL REGRESSION ({'updating baselines' if update else f'{len(baselines)} baselines'})")
+    print(f"{'='*70}")
+
+    results = []
+    for viewport_name, viewport in VISUAL_VIEWPORTS.items():
+        for theme in VISUAL_THEMES:
+            context = browser.new_context(viewport=viewport, device_scale_factor=1)
+            context.add_init_script(f"localStorage.setItem('theme', '{theme}')")
+            # Live annotations would paint student highlights into the panels
+            context.route("https://static.cloudbase.net/**", lambda route: route.abort())
+            page = context.new_page()
+
+            for config in PAGES:
+                try:
+                    page.goto(f"{BASE_URL}/{config['file']}", wait_until="networkidle", timeout=30000)
+                    page.evaluate("() => document.fonts.ready")
+                    time.sleep(1)
+
+                    for section_id, png in capture_tabs(page, config):
+                        key = f"{config['file'].split('-')[0]}/{section_id}-{theme}-{viewport_name}"
+                        if update:
+                            path = os.path.join(VISUAL_BASELINE_DIR, key + ".png")
+                            os.makedirs(os.path.dirname(path), exist_ok=True)
+                            with open(path, "wb") as f:
+                                f.write(png)
+                            baselines[key] = baseline_entry(load_pixels(png))
+                            continue
+
+                        result = compare_screenshot(key, png, baselines)
+                        results.append(result)
+                        if result["status"] == "fail":
+                            print(f"  [FAIL] {key}: {result['reason']} (hash distance {result['distance']})"
+                                  if "distance" in result else f"  [FAIL] {key}: {result['reason']}")
+                        elif result["status"] == "new":
+                            print(f"  [WARN] {key}: no baseline (run with --update-baselines)")
+
+                except Exception as e:
+                    results.append({"key": config["file"], "status": "fail", "reason": str(e)[:100]})
+                    print(f"  [FAIL] {config['file']} ({theme}, {viewport_name}): {str(e)[:50]}")
+
+            context.close()
+
+    if update:
+        os.makedirs(VISUAL_BASELINE_DIR, exist_ok=True)
+        with open(hash_file, "w") as f:
+            json.dump(dict(sorted(baselines.items())), f, indent=2)
+        print(f"  [INFO] {len(baselines)} baselines written to {VISUAL_BASELINE_DIR}/")
+        return results
+
+    diffed = sum(1 for r in results if r.get("distance", 0) > HASH_THRESHOLD)
+    failed = sum(1 for r in results if r["status"] == "fail")
+    new = sum(1 for r in results if r["status"] == "new")
+    print(f"  [INFO] {len(results)} screenshots, {diffed} pixel-diffed, {failed} failed, {new} without baseline")
+    return results
+
+
+def summarize_frames(sample):
+    """Reduce a frame sample to FPS, dropped frames, worst frame and long-task totals"""
+    frames = sample["frames"]
+    elapsed = sum(frames)
+    return {
+        "fps": len(frames) / elapsed * 1000 if elapsed else 0,
+        "dropped": sum(max(0, round(d / FRAME_MS) - 1) for d in frames),
+        "worst_frame_ms": max(frames, default=0),
+        "long_tasks": len(sample["longTasks"]),
+        "blocking_ms": sum(max(0, d - 50) for d in sample["longTasks"])
+    }
+
+
+def over_budget(key, kind, summary):
+    """Return the budget lines a widget summary violates"""
+    budget = FRAME_BUDGETS.get(key, FRAME_BUDGETS[kind])
+    problems = []
+    if summary["fps"] < budget["min_fps"]:
+        problems.append(f"{summary['fps']:.0f} fps < {budget['min_fps']}")
+    if summary["dropped"] > budget["max_dropped"]:
+        problems.append(f"{summary['dropped']} dropped > {budget['max_dropped']}")
+    if summary["worst_frame_ms"] > budget["worst_frame_ms"]:
+        problems.append(f"worst frame {summary['worst_frame_ms']:.0f}ms > {budget['worst_frame_ms']}ms")
+    return problems
+
+
+def measure_step_widgets(page, config):
+    """Play every step animation on the page and return (widget name, frame sample) pairs
+
+    A widget that can't be measured gets {"error": ...} in place of its sample.
+    """
+    widgets = page.evaluate(f"""
+        () => Array.from(document.querySelectorAll('[onclick^="animReset("]')).map(btn => {{
+            const panel = btn.closest('.{config["panel_class"]}');
+            return {{
+                name: btn.getAttribute('onclick').match(/'([^']+)'/)[1],
+                panel: panel ? panel.id : null
+            }};
+        }})
+    """)
+
+    tabs = page.query_selector_all(".nav-tab")
+    samples = []
+    for widget in widgets:
+        name = widget["name"]
+        reset = page.locator(f"""[onclick="animReset('{name}')"]""").first
+        try:
+            if widget["panel"] in config["section_ids"]:
+                tabs[config["section_ids"].index(widget["panel"])].click()
+                time.sleep(0.5)
+
+            # Widgets sit in problem-type accordions that start collapsed, where
+            # max-height: 0 leaves nothing for a real click to hit
+            expanded = reset.evaluate("""
+                el => {
+                    const accordion = el.closest('.problem-type.collapsed');
+                    if (accordion) accordion.querySelector('.problem-type-header').click();
+                    return !!accordion;
+                }
+            """)
+            if expanded:
+                time.sleep(0.5)  # max-height transition
+
+            reset.scroll_into_view_if_needed()
+            reset.evaluate("el => el.click()")
+            time.sleep(0.3)
+
+            # Autoplaying widgets advance on setInterval; the rest are stepped with Next
+            sample = page.evaluate(f"""
+                async () => {{
+                    const wait = ms => new Promise(r => setTimeout(r, ms));
+                    const play = document.querySelector(`[onclick="animToggle('{name}')"]`);
+                    const next = document.querySelector(`[onclick^="animNext"][onclick*="'{name}'"]`);
+
+                    __frameSampler.start();
+                    if (play) {{
+                        play.click();
+                        const deadline = performance.now() + 30000;
+                        while (animations['{name}'].playing && performance.now() < deadline) await wait(100);
+                    }} else if (next) {{
+                        const container = next.closest('.animation-controls') || next.parentElement;
+                        const counter = () => (container.querySelector('.step-counter') || container).textContent;
+                        for (let i = 0; i < 12; i++) {{
+                            const before = counter();
+                            next.click();
+                            await wait(400);
+                            if (counter() === before) break;
+                        }}
+                    }}
+                    await wait(100);  // let pending long-task entries arrive
+                    return __frameSampler.stop();
+                }}
+            """)
+            reset.evaluate("el => el.click()")
+            samples.append((name, sample))
+        except Exception as e:
+            samples.append((name, {"error": str(e)[:100]}))
+
+    return samples
+
+
+def measure_graph_redraw(page):
+    """Toggle the theme twice, which redraws every Plotly graph, and return the frame sample"""
+    return page.evaluate("""
+        async () => {
+            const wait = ms => new Promise(r => setTimeout(r, ms));
+            const themeBtn = document.querySelector('.theme-toggle');
+            __frameSampler.start();
+            if (themeBtn) {
+                themeBtn.click();
+                await wait(1000);
+                themeBtn.click();
+                await wait(1000);
+            }
+            return __frameSampler.stop();
+        }
+    """)
+
+
+def run_interaction_perf(browser, profile):
+    """Measure frame timings of step animations and graph redraws against the frame budgets"""
+    print(f"\n{'='*70}")
+    print(f"  INTERACTION PERFORMANCE ({profile['name']}, {profile['cpu_slowdown']}x CPU)")
+    print(f"{'='*70}")
+
+    context, page, _ = new_profile_context(browser, profile, throttle_network=False)
+    context.add_init_script(FRAME_SAMPLER)
+    results = []
+
+    for config in PAGES:
+        prefix = config["file"].split("-")[0]
+        print(f"\n  {config['file']}")
+        try:
+            # Eager hydration so the theme toggle redraws every graph on the page
+            page.goto(f"{BASE_URL}/{config['file']}?hydrate=eager", wait_until="networkidle", timeout=60000)
+            time.sleep(1)
+
+            samples = [(name, "steps", sample) for name, sample in measure_step_widgets(page, config)]
+            samples.append(("plotly-redraw", "graphs", measure_graph_redraw(page)))
+
+            for name, kind, sample in samples:
+                key = f"{prefix}/{name}"
+                if "error" in sample:
+                    results.append({"widget": key, "kind": kind, "problems": [sample["error"]]})
+                    print(f"  [FAIL] {name:<22} {sample['error'][:50]}")
+                    continue
+                summary = summarize_frames(sample)
+                problems = over_budget(key, kind, summary)
+                results.append(dict(summary, widget=key, kind=kind, problems=problems))
+
+                status = "FAIL" if problems else "PASS"
+                print(f"  [{status}] {name:<22} {summary['fps']:>5.1f} fps  {summary['dropped']:>3} dropped  "
+                      f"worst {summary['worst_frame_ms']:>5.0f}ms  TBT {summary['blocking_ms']:>4.0f}ms"
+                      + (f"  ({'; '.join(problems)})" if problems else ""))
+
+        except Exception as e:
+            results.append({"widget": prefix, "kind": "page", "problems": [str(e)[:100]]})
+            print(f"  [FAIL] {config['file']}: {str(e)[:50]}")
+
+    context.close()
+    return results
+
+
 def main():
     """Run all thorough tests"""
+    parser = argparse.ArgumentParser(description="Browser tests for the AP Calculus BC unit pages")
+    parser.add_argument("--perf", action="store_true",
+                        help="also measure load and interaction metrics under each device/network profile")
+    parser.add_argument("--profiles", default=",".join(p["name"] for p in PROFILES),
+                        help="comma-separated profile names for --perf (default: all)")
+    parser.add_argument("--visual", action="store_true",
+                        help="compare screenshots of every tab, theme and viewport against visual_baselines/")
+    parser.add_argument("--update-baselines", action="store_true",
+                        help="with --visual, store the current screenshots as the new baselines")
+    parser.add_argument("--interaction", action="store_true",
+                        help="play every step animation and graph redraw and check frame timings against FRAME_BUDGETS")
+    parser.add_argument("--interaction-profile", default="mid-tier-mobile",
+                        choices=[p["name"] for p in PROFILES],
+                        help="device profile whose CPU slowdown and viewport --interaction uses")
+    args = parser.parse_args()
+    if args.update_baselines and not args.visual:
+        parser.error("--update-baselines only applies with --visual")
+    if args.visual and np is None:
+        parser.error("--visual needs numpy and Pillow (pip install numpy pillow)")
+
+    profile_names = [p["name"] for p in PROFILES]
+    unknown = [name for name in args.profiles.split(",") if name not in profile_names]
+    if unknown:
+        parser.error(f"unknown profile(s) {', '.join(unknown)}; choose from {', '.join(profile_names)}")
+    profiles = [p for p in PROFILES if p["name"] in args.profiles.split(",")]
+
     print("\n" + "="*70)
     print("  COMPREHENSIVE AUTOMATED TESTING - AP CALCULUS BC UNIT 1")
     print("  Testing all interactive elements thoroughly")
@@ -768,6 +1543,18 @@ def main():
             result = test_page_thoroughly(page, config)
             all_results.append(result)
 
+        all_results.append(test_repeat_visits(browser))
+
+        if args.perf:
+            perf_results = run_profile_matrix(browser, profiles)
+
+        if args.visual:
+            visual_results = run_visual_regression(browser, update=args.update_baselines)
+
+        if args.interaction:
+            profile = next(p for p in PROFILES if p["name"] == args.interaction_profile)
+            interaction_results = run_interaction_perf(browser, profile)
+
         browser.close()
 
     # ========== FINAL SUMMARY ==========
@@ -810,6 +1597,16 @@ def main():
 
     print(f"OVERALL: {total_passed}/{total_tests} tests passed ({pass_rate:.1f}%)")
     print(f"Warnings: {total_warnings}")
+    if args.visual:
+        visual_failed = sum(1 for r in visual_results if r["status"] == "fail")
+        visual_new = sum(1 for r in visual_results if r["status"] == "new")
+        total_failed += visual_failed
+        print(f"Visual: {len(visual_results) - visual_failed - visual_new}/{len(visual_results)} screenshots match, "
+              f"{visual_failed} failed, {visual_new} without baseline")
+    if args.interaction:
+        janky = [r["widget"] for r in interaction_results if r["problems"]]
+        total_failed += len(janky)
+        print(f"Interaction: {len(interaction_results) - len(janky)}/{len(interaction_results)} widgets within frame budget")
     print("-"*70)
 
     # Save detailed results
@@ -817,6 +1614,21 @@ def main():
         json.dump(all_results, f, indent=2)
     print("\nDetailed results saved to: test_results.json")
 
+    if args.perf:
+        with open("perf_results.json", "w") as f:
+            json.dump(perf_results, f, indent=2)
+        print("Profile metrics saved to: perf_results.json")
+
+    if args.visual and not args.update_baselines:
+        with open("visual_results.json", "w") as f:
+            json.dump(visual_results, f, indent=2)
+        print("Visual results saved to: visual_results.json")
+
+    if args.interaction:
+        with open("interaction_results.json", "w") as f:
+            json.dump(interaction_results, f, indent=2)
+        print("Frame timings saved to: interaction_results.json")
+
     return 0 if total_failed == 0 else 1
 
 